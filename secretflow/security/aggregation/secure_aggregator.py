@@ -12,10 +12,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from typing import Any, Dict, List, Tuple, Union
 
 import numpy as np
 import pandas as pd
+from randomgen import AESCounter
 
 import secretflow.utils.ndarray_encoding as ndarray_encoding
 from secretflow.security.diffie_hellman import DiffieHellman
@@ -25,6 +28,141 @@ from secretflow.device.device.pyu import PYUObject
 from secretflow.security.aggregation import Aggregator
 from secretflow.security.aggregation._utils import is_nesting_list
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+if numba is not None:
+    @numba.njit(nogil=True)
+    def _accumulate_raw_kernel(next_uint64, states, num_add, out):
+        # Add the raw streams of the first num_add states to out and subtract the
+        # others in a single pass, each stream is consumed in element order.
+        for i in range(out.size):
+            value = out[i]
+            for j in range(num_add):
+                value += np.int64(next_uint64(states[j]))
+            for j in range(num_add, states.size):
+                value -= np.int64(next_uint64(states[j]))
+            out[i] = value
+
+
+# The number of elements masked by a task of the pool. Forking the generators of
+# a chunk costs about as much as masking a few thousand elements, about 1% of a chunk.
+_MASK_CHUNK_SIZE = 1 << 18
+
+
+def _aes_key(secret: str) -> np.ndarray:
+    # The secret is already a sha256 hex digest, so its first 128 bits are used as
+    # the AES key directly instead of going through a Python int. The byte order
+    # is fixed for the peers to agree on the key regardless of their platforms.
+    return np.frombuffer(bytes.fromhex(secret)[:16], dtype='<u8')
+
+
+def _fork_rng(rng: AESCounter, offset: int) -> AESCounter:
+    """Copy rng into a new generator whose stream starts offset draws later."""
+    forked = AESCounter(key=0)
+    forked.state = rng.state
+    return forked.advance(offset)
+
+
+def _draw_mask(rng: AESCounter, shape: Tuple[int, ...]) -> np.ndarray:
+    # The raw counter mode output is uniform over all 64 bits, which is exactly the
+    # distribution the masks need modulo 2**64, without the bounded integer sampling.
+    return rng.random_raw(size=shape).view(np.int64)
+
+
+def _apply_masks(masked_datum: np.ndarray, add_rngs: List[AESCounter], sub_rngs: List[AESCounter]) -> None:
+    """Add the masks of add_rngs to masked_datum in place and subtract the masks
+    of sub_rngs. masked_datum must be C contiguous when numba is available.
+
+    With numba, the raw streams of all the peers are read through the ctypes
+    interface of AESCounter and accumulated in one pass without any mask
+    array. The masks equal those of `_draw_mask`, so peers with and without
+    numba agree.
+    """
+    if numba is not None:
+        rngs = add_rngs + sub_rngs
+        if not rngs:
+            return
+        # Setting the shape of a view raises instead of copying like reshape, so the
+        # masks can never land in a temporary and leave masked_datum unmasked.
+        flat = masked_datum.view()
+        flat.shape = (-1,)
+        # All AESCounter share the same next_uint64 and differ in their states.
+        states = np.array([rng.ctypes.state_address for rng in rngs], dtype=np.uint64)
+        with ExitStack() as stack:
+            for rng in rngs:
+                stack.enter_context(rng.lock)
+            _accumulate_raw_kernel(rngs[0].ctypes.next_uint64, states, len(add_rngs), flat)
+        return
+    # Both the encoded floats and the integers are int64, whose in place
+    # arithmetic with the raw 64-bit masks wraps modulo 2**64.
+    for rng in add_rngs:
+        np.add(masked_datum, _draw_mask(rng, masked_datum.shape), out=masked_datum)
+    for rng in sub_rngs:
+        np.subtract(masked_datum, _draw_mask(rng, masked_datum.shape), out=masked_datum)
+
+
+def _flatten(masked_data: List[np.ndarray]):
+    """Yield a flat view of every C contiguous datum with its offset in the streams."""
+    offset = 0
+    for masked_datum in masked_data:
+        # Setting the shape of a view raises instead of copying.
+        flat = masked_datum.view()
+        flat.shape = (-1,)
+        yield flat, offset
+        offset += flat.size
+
+
+def _accumulator(masked_datum: np.ndarray) -> np.ndarray:
+    # The aggregating function owns the masked data, so the first party is reused
+    # as the accumulator unless it is read only, as the arrays fetched from the
+    # object store are.
+    return masked_datum if masked_datum.flags.writeable else masked_datum.copy()
+
+
+def _sum_masked(masked_data: List[np.ndarray], axis=None):
+    """Same as `np.sum(masked_data, axis=axis)`.
+
+    When summing across the parties (axis is 0), the masked data is accumulated
+    in place one party at a time instead of being stacked into a new ndarray
+    first. When summing everything (axis is None), every party is reduced on
+    its own first, which gives the same sum modulo 2**64.
+
+    Unlike np.sum, summing with axis 0 mutates `masked_data[0]` in place
+    unless it is read only, so do not pass data that is still needed.
+    """
+    if axis is None:
+        return np.sum([np.sum(masked_datum) for masked_datum in masked_data])
+    if axis != 0:
+        return np.sum(masked_data, axis=axis)
+    result = _accumulator(masked_data[0])
+    for masked_datum in masked_data[1:]:
+        np.add(result, masked_datum, out=result)
+    return result
+
+
+def _sum_masked_list(masked_data: List[List[np.ndarray]], axis=None) -> List:
+    """Same as `[np.sum(element, axis=axis) for element in zip(*masked_data)]`.
+
+    When summing across the parties (axis is 0), the list of every party is
+    added position by position into the list of the first party, so neither
+    the per position tuples nor stacked ndarrays are built.
+
+    Unlike np.sum, summing with axis 0 mutates the arrays of `masked_data[0]`
+    in place unless they are read only, so do not pass data that is still
+    needed.
+    """
+    if axis != 0:
+        return [_sum_masked(element, axis=axis) for element in zip(*masked_data)]
+    results = [_accumulator(masked_datum) for masked_datum in masked_data[0]]
+    for party_data in masked_data[1:]:
+        for result, masked_datum in zip(results, party_data):
+            np.add(result, masked_datum, out=result)
+    return results
+
 
 @proxy(PYUObject)
 class _Masker:
@@ -33,15 +171,27 @@ class _Masker:
         self._dh = DiffieHellman()
         self._pub_key, self._pri_key = self._dh.generate_key_pair()
         self._fraction_precesion = fraction_precesion
+        self._pool = None
 
     def pub_key(self) -> int:
         return self._pub_key
 
     def gen_rng(self, pub_keys: Dict[PYU, int]) -> None:
         assert pub_keys, f'Public keys is None or empty.'
-        self._rngs = {device: np.random.default_rng(
-            int(self._dh.generate_secret(self._pri_key, peer_pub_key),
-                base=16)) for device, peer_pub_key in pub_keys.items() if device != self._device}
+        # AESCounter uses AES-NI when available, which is much faster than PCG64
+        # for the large masks drawn in `mask`.
+        rngs = {device: AESCounter(key=_aes_key(self._dh.generate_secret(self._pri_key, peer_pub_key)))
+                for device, peer_pub_key in pub_keys.items() if device != self._device}
+        # Masks of the peers after this device are added and the others are subtracted,
+        # so the masks of every pair cancel out in the sum.
+        self._add_rngs = [rng for device, rng in rngs.items() if device > self._device]
+        self._sub_rngs = [rng for device, rng in rngs.items() if device < self._device]
+        # The pool masks the chunks of the data concurrently, both the numba kernel and
+        # the generators release the GIL. Its threads are only started once tasks are
+        # submitted.
+        if self._pool is not None:
+            self._pool.shutdown()
+        self._pool = ThreadPoolExecutor()
 
     def mask(self,
              data: Union
@@ -61,29 +211,43 @@ class _Masker:
                 datum = datum.values
             assert isinstance(datum, np.ndarray), f'Accept ndarray or dataframe/series only but got {type(datum)}'
             if dtype is None:
+                # All data share the dtype, so categorize it only once.
                 dtype = datum.dtype
+                is_float = np.issubdtype(dtype, np.floating)
+                assert is_float or np.issubdtype(dtype, np.integer), f'Data type are neither integer nor float.'
             else:
                 assert datum.dtype == dtype, f'Data should have same dtypes but got {datum.dtype} {dtype}.'
-            is_float = np.issubdtype(datum.dtype, np.floating)
-            if not is_float:
-                assert np.issubdtype(
-                    datum.dtype, np.integer), f'Data type are neither integer nor float.'
-                if datum.dtype != np.int64:
-                    datum = datum.astype(np.int64)
             # Do mulitple before encoding to finite field.
-            masked_datum: np.ndarray = ndarray_encoding.encode(
-                datum * weight, self._fraction_precesion) if is_float else datum * weight
-            for pyu, rng in self._rngs.items():
-                if pyu == self._device:
-                    continue
-                mask = rng.integers(low=np.iinfo(np.int64).min, high=np.iinfo(np.int64).max,
-                                    size=masked_datum.shape).astype(masked_datum.dtype)
-                if pyu > self._device:
-                    masked_datum += mask
-                else:
-                    masked_datum -= mask
-
-            masked_data.append(masked_datum)
+            if is_float:
+                masked_datum: np.ndarray = ndarray_encoding.encode_weighted(datum, weight, self._fraction_precesion)
+            elif isinstance(weight, (int, np.integer)):
+                # Widen small integers to int64 and weight them in a single pass. The masks
+                # stay int64 for any dtype since the sum of the parties needs the headroom.
+                masked_datum = np.multiply(datum, weight, dtype=np.int64, order='C')
+            else:
+                masked_datum = datum.astype(np.int64) * weight
+            # The masks are laid out in C order on every party. Unlike
+            # np.ascontiguousarray, np.require keeps 0-d data 0-d.
+            masked_data.append(np.require(masked_datum, requirements='C'))
+        rngs = self._add_rngs + self._sub_rngs
+        chunks = [(flat[start:start + _MASK_CHUNK_SIZE], offset + start)
+                  for flat, offset in _flatten(masked_data) for start in range(0, flat.size, _MASK_CHUNK_SIZE)]
+        if len(chunks) > 1 and rngs:
+            # Mask every chunk with forks of the generators starting where its masks
+            # begin in the streams. The chunks are masked concurrently, while the masks
+            # stay the same as drawing them datum by datum on the peers.
+            futures = []
+            for chunk, offset in chunks:
+                add_rngs = [_fork_rng(rng, offset) for rng in self._add_rngs]
+                sub_rngs = [_fork_rng(rng, offset) for rng in self._sub_rngs]
+                futures.append(self._pool.submit(_apply_masks, chunk, add_rngs, sub_rngs))
+            for rng in rngs:
+                rng.advance(sum(masked_datum.size for masked_datum in masked_data))
+            for future in futures:
+                future.result()
+        else:
+            for masked_datum in masked_data:
+                _apply_masks(masked_datum, self._add_rngs, self._sub_rngs)
         if is_list:
             return masked_data, dtype
         else:
@@ -125,10 +289,10 @@ class SecureAggregator(Aggregator):
             is_float = np.issubdtype(dtypes[0], np.floating)
 
             if is_nesting_list(masked_data):
-                results = [np.sum(element, axis=axis) for element in zip(*masked_data)]
+                results = _sum_masked_list(masked_data, axis=axis)
                 return [ndarray_encoding.decode(result, self._fraction_precesion) for result in results] if is_float else results
             else:
-                result = np.sum(masked_data, axis=axis)
+                result = _sum_masked(masked_data, axis=axis)
                 return ndarray_encoding.decode(result, self._fraction_precesion) if is_float else result
 
         self._check_data(data)
@@ -151,16 +315,15 @@ class SecureAggregator(Aggregator):
             if weights:
                 sum_weights = np.sum(weights)
             if is_nesting_list(masked_data):
-                sum_data = [np.sum(element, axis=axis) for element in zip(*masked_data)]
+                sum_data = _sum_masked_list(masked_data, axis=axis)
                 if is_float:
                     sum_data = [ndarray_encoding.decode(sum_datum, self._fraction_precesion) for sum_datum in sum_data]
                 return [element / sum_weights for element in sum_data]
             else:
+                sum_data = _sum_masked(masked_data, axis=axis)
                 if is_float:
-                    return ndarray_encoding.decode(
-                        np.sum(masked_data, axis=axis),
-                        self._fraction_precesion) / sum_weights
-                return np.sum(masked_data, axis=axis) / sum_weights
+                    return ndarray_encoding.decode(sum_data, self._fraction_precesion) / sum_weights
+                return sum_data / sum_weights
 
         self._check_data(data)
         masked_data = [None] * len(data)
@@ -12,13 +12,44 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from functools import lru_cache
+
 import numpy as np
 
 from .errors import InvalidArgumentError
 
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _encode_kernel(m, scale, upper_bound, out):
+        # Scale and truncate in one pass without temporaries, counting the values
+        # whose magnitude reaches the upper bound or which are NaN along the way.
+        num_exceeded = 0
+        for i in numba.prange(m.size):
+            value = m[i] * scale
+            if not abs(value) < upper_bound:
+                num_exceeded += 1
+            out[i] = np.int64(value)
+        return num_exceeded
+
+    @numba.njit(parallel=True, cache=True)
+    def _decode_kernel(m, scale, out):
+        for i in numba.prange(m.size):
+            out[i] = m[i] / scale
+
+
+@lru_cache(maxsize=None)
+def _scale(fraction_precesion: int) -> np.float64:
+    return np.float64(10 ** fraction_precesion)
+
 
 def encode(m: np.ndarray, fraction_precesion: int) -> np.ndarray:
-    """Encode float ndarray to uint64 finite field.
+    """Encode float ndarray to int64 ring, i.e. integers modulo 2**64.
     Float will times 10**fraction_precesion firstly.
 
     Args:
@@ -26,6 +57,23 @@ def encode(m: np.ndarray, fraction_precesion: int) -> np.ndarray:
         fraction_precesion (int): keep how many decimal digits after the dot.
             Must provide if ndarray dtype is float.
 
+    Returns:
+        np.ndarray: the encoded ndarray.
+    """
+    return encode_weighted(m, 1, fraction_precesion)
+
+
+def encode_weighted(m: np.ndarray, weight, fraction_precesion: int) -> np.ndarray:
+    """Encode float ndarray times weight to int64 ring.
+    Same as `encode(m * weight, fraction_precesion)` but a scalar weight is
+    applied in the encoding pass instead of a temporary ndarray.
+
+    Args:
+        m (np.ndarray): the ndarray to encode.
+        weight: the weight to multiply, a scalar or an ndarray broadcastable to m.
+        fraction_precesion (int): keep how many decimal digits after the dot.
+            Must provide if ndarray dtype is float.
+
     Returns:
         np.ndarray: the encoded ndarray.
     """
@@ -33,21 +81,41 @@ def encode(m: np.ndarray, fraction_precesion: int) -> np.ndarray:
     if m.dtype not in [np.float16, np.float32, np.float64]:
         raise InvalidArgumentError(f'Accept float ndarray only but got {m.dtype}')
 
-    uint64_max = 0xFFFFFFFFFFFFFFFF
+    # Float64 cannot represent int64 max, which rounds up to 2**63 and wraps to int64
+    # min when cast. So the scaled magnitude must be strictly below 2**63.
+    upper_bound = 2.0 ** 63
     assert fraction_precesion is not None, f'Fraction precesion must not be None.'
-    max_value = m.max()
-    if max_value * (10 ** fraction_precesion) > uint64_max:
-        raise InvalidArgumentError(f'Float data exceeds uint range (0, {uint64_max}) after encoding.')
-    # Convert to np.float64 for reducing overflow.
-    return (m.astype(np.float64) * (10 ** fraction_precesion)).astype(np.uint64)
+    if np.ndim(weight) != 0:
+        m = m * weight
+        weight = 1
+    # Multiply float32 in np.float32, which keeps about the relative precision of
+    # the input itself and halves the memory traffic. Others use np.float64 for
+    # reducing overflow. The result is int64 whatever the precision, since the
+    # masks and the sum of the parties are in the int64 ring.
+    compute_dtype = np.float32 if m.dtype == np.float32 else np.float64
+    scale = compute_dtype(_scale(fraction_precesion) * weight)
+    if numba is not None and m.dtype != np.float16:
+        # The kernel checks the range while encoding, which saves a scan of m.
+        out = np.empty(m.shape, dtype=np.int64)
+        if _encode_kernel(m.ravel(), scale, upper_bound, out.reshape(-1)):
+            raise InvalidArgumentError(f'Float data is NaN or exceeds int64 range (-2**63, 2**63) after encoding.')
+        return out
+    # The ufunc casts the input on the fly instead of copying it, and lays the
+    # result out in C order as the masks are.
+    scaled = np.multiply(m, scale, dtype=compute_dtype, order='C')
+    # NaN propagates to max and min and fails the comparisons as well.
+    if scaled.size and not (scaled.max() < upper_bound and scaled.min() > -upper_bound):
+        raise InvalidArgumentError(f'Float data is NaN or exceeds int64 range (-2**63, 2**63) after encoding.')
+    return scaled.astype(np.int64)
 
 
 def decode(m: np.ndarray, fraction_precesion: int) -> np.ndarray:
-    """Decode ndarray from uint64 finite field to the float.
+    """Decode ndarray from int64 ring to the float.
     Fraction precesion shall be corresponding to encoding fraction precesion.
 
     Args:
-        m (np.ndarray): the ndarray to decode.
+        m (np.ndarray): the ndarray to decode. uint64 is accepted as well
+            and has the same bit patterns.
         fraction_precesion (int): the decimal digits to keep when encoding float.
             Must provide if the original dtype is float.
 
@@ -55,7 +123,12 @@ def decode(m: np.ndarray, fraction_precesion: int) -> np.ndarray:
         np.ndarray: the decoded float ndarray.
     """
     assert isinstance(m, np.ndarray), f'Support ndarray only but got {type(m)}'
-    assert m.dtype == np.uint64, f'Ndarray dtype must be uint but got {m.dtype}'
+    assert m.dtype in [np.int64, np.uint64], f'Ndarray dtype must be int64 or uint64 but got {m.dtype}'
     assert fraction_precesion is not None, f'Fraction precesion must not be None.'
-    # Convert to int for restoring the negetives.
-    return m.astype(np.int64) / (10 ** fraction_precesion)
+    scale = _scale(fraction_precesion)
+    if numba is not None:
+        out = np.empty(m.shape, dtype=np.float64)
+        _decode_kernel(m.ravel().view(np.int64), scale, out.reshape(-1))
+        return out
+    # View uint64 as int for restoring the negetives.
+    return m.view(np.int64) / scale
@@ -70,3 +70,14 @@ class TestAggregatorBase:
         # THEN
         np.testing.assert_equal(sum[0], np.array([[7, 8, 9], [10, 11, 12]]))
         np.testing.assert_equal(sum[1], np.array([[27, 28, 29], [30, 31, 32]]))
+
+    def test_average_on_float_with_weights_should_ok(self):
+        # GIVEN
+        a = self.alice(lambda: np.array([[1., 2., 3.], [4., 5., 6.]]))()
+        b = self.bob(lambda: np.array([[11., 12., 13.], [14., 15., 16.]]))()
+
+        # WHEN
+        sum = self.aggregator.average([a, b], axis=0, weights=[2, 3])
+
+        # THEN
+        np.testing.assert_almost_equal(sum, np.array([[7., 8., 9.], [10., 11., 12.]]), decimal=3)
@@ -1,3 +1,10 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+from randomgen import AESCounter
+
+from secretflow.security.aggregation import secure_aggregator
 from secretflow.security.aggregation.secure_aggregator import SecureAggregator
 
 from tests.basecase import DeviceTestCase
@@ -9,3 +16,85 @@ class TestSecureAggregator(DeviceTestCase, TestAggregatorBase):
     def setUpClass(cls):
         super().setUpClass()
         cls.aggregator = SecureAggregator(cls.carol, [cls.alice, cls.bob])
+
+
+class TestApplyMasks(unittest.TestCase):
+    @unittest.skipIf(secure_aggregator.numba is None, 'numba is not installed.')
+    def test_apply_masks_with_numba_should_equal_raw_stream(self):
+        # GIVEN
+        add_key = np.array([1, 2], dtype='<u8')
+        sub_key = np.array([3, 4], dtype='<u8')
+        add_rng, sub_rng = AESCounter(key=add_key), AESCounter(key=sub_key)
+        expected_add_rng, expected_sub_rng = AESCounter(key=add_key), AESCounter(key=sub_key)
+
+        for shape in [(), (0,), (3, 4), (5,), (2,)]:
+            datum = np.arange(int(np.prod(shape)), dtype=np.int64).reshape(shape)
+
+            # WHEN
+            masked_datum = datum.copy()
+            secure_aggregator._apply_masks(masked_datum, [add_rng], [sub_rng])
+
+            # THEN
+            expected = datum + expected_add_rng.random_raw(size=shape).view(np.int64) \
+                - expected_sub_rng.random_raw(size=shape).view(np.int64)
+            np.testing.assert_equal(masked_datum, expected)
+
+    def test_apply_masks_on_fortran_order_should_never_leave_unmasked(self):
+        # GIVEN
+        key = np.array([1, 2], dtype='<u8')
+        datum = np.asfortranarray(np.arange(6, dtype=np.int64).reshape(2, 3))
+        expected = datum + AESCounter(key=key).random_raw(size=(2, 3)).view(np.int64)
+
+        # WHEN
+        with mock.patch.object(secure_aggregator, 'numba', None):
+            masked_datum = datum.copy(order='F')
+            secure_aggregator._apply_masks(masked_datum, [AESCounter(key=key)], [])
+
+        # THEN
+        np.testing.assert_equal(masked_datum, expected)
+        if secure_aggregator.numba is not None:
+            with self.assertRaises(AttributeError):
+                secure_aggregator._apply_masks(datum.copy(order='F'), [AESCounter(key=key)], [])
+
+    def test_fork_rng_should_start_at_offset(self):
+        # GIVEN
+        key = np.array([5, 6], dtype='<u8')
+        rng, expected_rng = AESCounter(key=key), AESCounter(key=key)
+        rng.random_raw(3)
+
+        # WHEN
+        forked = secure_aggregator._fork_rng(rng, 7)
+
+        # THEN
+        np.testing.assert_equal(forked.random_raw(5), expected_rng.random_raw(15)[10:])
+        np.testing.assert_equal(rng.random_raw(5), AESCounter(key=key).random_raw(8)[3:])
+
+
+class TestSumMasked(unittest.TestCase):
+    def test_sum_masked_should_equal_np_sum(self):
+        for axis in [0, None, 1]:
+            # GIVEN
+            masked_data = [np.arange(12, dtype=np.int64).reshape(3, 4) * (i + 1) for i in range(3)]
+            expected = np.sum(masked_data, axis=axis)
+            masked_data[1].flags.writeable = False
+
+            # WHEN
+            result = secure_aggregator._sum_masked(masked_data, axis=axis)
+            results = secure_aggregator._sum_masked_list(
+                [[np.arange(12, dtype=np.int64).reshape(3, 4) * (i + 1)] for i in range(3)], axis=axis)
+
+            # THEN
+            np.testing.assert_equal(result, expected)
+            np.testing.assert_equal(results[0], expected)
+
+    def test_sum_masked_should_copy_read_only_first_party(self):
+        # GIVEN
+        first = np.arange(4, dtype=np.int64)
+        first.flags.writeable = False
+
+        # WHEN
+        result = secure_aggregator._sum_masked([first, np.ones(4, dtype=np.int64)], axis=0)
+
+        # THEN
+        np.testing.assert_equal(result, np.arange(1, 5))
+        np.testing.assert_equal(first, np.arange(4))
@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from secretflow.utils import ndarray_encoding
+from secretflow.utils.errors import InvalidArgumentError
+
+
+class TestNdarrayEncoding(unittest.TestCase):
+    def setUp(self):
+        self.data = np.random.default_rng(0).standard_normal((50, 8)) * 100
+
+    def test_encode_decode_should_ok(self):
+        for dtype in [np.float16, np.float32, np.float64]:
+            # GIVEN
+            m = self.data.astype(dtype)
+
+            # WHEN
+            encoded = ndarray_encoding.encode(m, 7)
+            decoded = ndarray_encoding.decode(encoded, 7)
+
+            # THEN
+            self.assertEqual(encoded.dtype, np.int64)
+            np.testing.assert_allclose(decoded, m.astype(np.float64), atol=1e-6)
+
+    @unittest.skipIf(ndarray_encoding.numba is None, 'numba is not installed.')
+    def test_encode_decode_with_and_without_numba_should_equal(self):
+        for dtype in [np.float16, np.float32, np.float64]:
+            # GIVEN
+            m = self.data.astype(dtype)
+
+            # WHEN
+            encoded = ndarray_encoding.encode_weighted(m, 3, 7)
+            decoded = ndarray_encoding.decode(encoded, 7)
+            with mock.patch.object(ndarray_encoding, 'numba', None):
+                expected_encoded = ndarray_encoding.encode_weighted(m, 3, 7)
+                expected_decoded = ndarray_encoding.decode(expected_encoded, 7)
+
+            # THEN
+            np.testing.assert_equal(encoded, expected_encoded)
+            np.testing.assert_equal(decoded, expected_decoded)
+
+    def test_encode_non_contiguous_should_ok(self):
+        # GIVEN
+        m = self.data[::2, 1::3]
+
+        # WHEN
+        encoded = ndarray_encoding.encode(m, 7)
+
+        # THEN
+        self.assertEqual(encoded.shape, m.shape)
+        np.testing.assert_equal(encoded, (m * 1e7).astype(np.int64))
+
+    def test_encode_overflow_should_error(self):
+        # GIVEN
+        m = np.array([1., 1e12])
+
+        # WHEN & THEN
+        with self.assertRaises(InvalidArgumentError):
+            ndarray_encoding.encode(m, 7)
+
+    def test_encode_negative_overflow_should_error(self):
+        # GIVEN
+        m = np.array([-1., -1e12])
+
+        # WHEN & THEN
+        with self.assertRaises(InvalidArgumentError):
+            ndarray_encoding.encode(m, 7)
+
+    def test_encode_boundary_and_nan_should_error(self):
+        for m in [np.array([2.0 ** 63]), np.array([-2.0 ** 63]), np.array([1., np.nan]),
+                  np.array([np.inf]), np.array([2.0 ** 63], dtype=np.float32)]:
+            for numba in [ndarray_encoding.numba, None]:
+                # WHEN & THEN
+                with mock.patch.object(ndarray_encoding, 'numba', numba), \
+                        self.assertRaises(InvalidArgumentError):
+                    ndarray_encoding.encode(m, 0)
+
+    def test_encode_below_boundary_should_ok(self):
+        # GIVEN
+        m = np.array([np.nextafter(2.0 ** 63, 0), -np.nextafter(2.0 ** 63, 0)])
+
+        # WHEN
+        encoded = ndarray_encoding.encode(m, 0)
+
+        # THEN
+        np.testing.assert_equal(encoded, np.array([2 ** 63 - 1024, -2 ** 63 + 1024]))
+
+    def test_decode_int64_and_uint64_should_ok(self):
+        # GIVEN
+        encoded = np.array([-15000000, 25000000], dtype=np.int64)
+
+        # WHEN
+        decoded = ndarray_encoding.decode(encoded, 7)
+        decoded_uint = ndarray_encoding.decode(encoded.view(np.uint64), 7)
+
+        # THEN
+        np.testing.assert_equal(decoded, np.array([-1.5, 2.5]))
+        np.testing.assert_equal(decoded_uint, np.array([-1.5, 2.5]))